@@ -0,0 +1,109 @@
+"""
+Relay actuation fast path
+
+When escalation rules fire, the relay is cut off straight from the analysis
+path, before the notifier runs or the response is built. Actuators are
+pluggable; LocalActuator is an in-process stand-in for tests and demos.
+"""
+
+import json
+import logging
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+RELAY_OFF = 0
+RELAY_ON = 1
+
+LATENCY_WINDOW = 1000
+
+# Cut-offs slower than this miss the single-digit-millisecond target
+SLOW_ACTUATION_MS = 10
+
+
+class Actuator(ABC):
+    """Interface for something that can switch a machine's relay"""
+
+    @abstractmethod
+    def set_relay(self, machine_id, state):
+        """Switch the relay of `machine_id` to `state` (RELAY_ON or RELAY_OFF)"""
+
+
+class LocalActuator(Actuator):
+    """Records relay commands in memory instead of switching hardware"""
+
+    def __init__(self):
+        self.states = {}
+        self.commands = deque(maxlen=LATENCY_WINDOW)
+
+    def set_relay(self, machine_id, state):
+        self.states[machine_id] = state
+        self.commands.append((machine_id, state, time.time()))
+
+
+class HttpActuator(Actuator):
+    """Posts relay commands to a gateway over HTTP"""
+
+    def __init__(self, url, timeout=0.5):
+        self.url = url
+        self.timeout = timeout
+
+    def set_relay(self, machine_id, state):
+        body = json.dumps({'machine_id': machine_id, 'relayState': state}).encode()
+        req = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            response.read()
+
+
+class RelayController:
+    """Issues relay cut-offs and measures reading-to-actuation latency"""
+
+    def __init__(self, actuator=None):
+        self.actuator = actuator or LocalActuator()
+        self.latencies_ms = deque(maxlen=LATENCY_WINDOW)
+        self.failures = 0
+        self.slow = 0
+        self.lock = threading.Lock()
+
+    def cut_off(self, machine_id, received_at):
+        """Open the relay for a machine; `received_at` is the perf_counter() when the reading arrived"""
+        try:
+            self.actuator.set_relay(machine_id, RELAY_OFF)
+        except Exception as e:
+            with self.lock:
+                self.failures += 1
+            logger.error(f"Relay cut-off failed for {machine_id}: {str(e)}")
+            return None
+
+        latency_ms = (time.perf_counter() - received_at) * 1000
+        slow = latency_ms > SLOW_ACTUATION_MS
+        with self.lock:
+            self.latencies_ms.append(latency_ms)
+            if slow:
+                self.slow += 1
+        if slow:
+            logger.warning(f"Slow relay cut-off for {machine_id}: {latency_ms:.2f} ms exceeds {SLOW_ACTUATION_MS} ms target")
+        else:
+            logger.info(f"Relay cut off for {machine_id} in {latency_ms:.2f} ms")
+        return latency_ms
+
+    def stats(self):
+        """Summarise recent reading-to-actuation latencies in milliseconds"""
+        with self.lock:
+            samples = sorted(self.latencies_ms)
+            failures = self.failures
+            slow = self.slow
+        if not samples:
+            return {'count': 0, 'failures': failures, 'slow': slow}
+        return {
+            'count': len(samples),
+            'failures': failures,
+            'slow': slow,
+            'p50_ms': samples[len(samples) // 2],
+            'p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+            'max_ms': samples[-1],
+        }
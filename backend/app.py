@@ -1,11 +1,22 @@
-from flask import Flask, request, jsonify
+from flask import Flask, g, request, jsonify
 from flask_cors import CORS
 import os
+import signal
+import sys
+import threading
 from twilio.rest import Client
 from twilio.twiml.voice_response import VoiceResponse
 import logging
 from datetime import datetime, timedelta
 import json
+import tempfile
+import time
+from rate_limit import IngestLimiter
+from dedupe import NEW, STALE, DedupeIndex
+from snapshot import SnapshotScheduler
+from csv_import import CsvImportError, import_csv_files
+from actuation import HttpActuator, LocalActuator, RelayController, RELAY_OFF
+from timeseries import SensorHistory, parse_timestamp_ms, parse_timestamp_strict
 
 app = Flask(__name__)
 CORS(app)
@@ -46,6 +57,66 @@ THRESHOLDS = {
 # Track emergency call history to prevent spam
 emergency_call_history = {}
 
+# Relay actuation: posts to a gateway when RELAY_ACTUATOR_URL is set, otherwise stays local
+RELAY_ACTUATOR_URL = os.getenv('RELAY_ACTUATOR_URL')
+relay_controller = RelayController(HttpActuator(RELAY_ACTUATOR_URL) if RELAY_ACTUATOR_URL else LocalActuator())
+
+# Ingest rate limits (requests per second, burst size) and concurrency cap
+ingest_limiter = IngestLimiter(
+    client_rate=float(os.getenv('RATE_LIMIT_CLIENT_RPS', 20)),
+    client_burst=float(os.getenv('RATE_LIMIT_CLIENT_BURST', 40)),
+    machine_rate=float(os.getenv('RATE_LIMIT_MACHINE_RPS', 10)),
+    machine_burst=float(os.getenv('RATE_LIMIT_MACHINE_BURST', 20)),
+    max_active=int(os.getenv('INGEST_MAX_ACTIVE', 4)),
+    max_waiting=int(os.getenv('INGEST_MAX_WAITING', 16)),
+    wait_timeout=float(os.getenv('INGEST_WAIT_TIMEOUT', 1.0))
+)
+
+# Compressed in-memory history of recent readings, keyed by machine
+sensor_history = SensorHistory()
+
+def record_reading(machine_id, timestamp_ms, data, sensor_data):
+    """Store a reading in the compressed sensor history"""
+    values = dict(sensor_data)
+    for field in ('vibration_x', 'vibration_y', 'vibration_z', 'relayState'):
+        values[field] = float(data.get(field, 0) or 0)
+    sensor_history.record(machine_id, timestamp_ms, values)
+
+# Index of recently delivered readings, used to drop re-deliveries
+dedupe_index = DedupeIndex()
+
+def reading_dedupe_key(data, machine_id, timestamp_ms):
+    """Build the (source, machine, timestamp) key for a reading, or None if it has no timestamp"""
+    if data.get('timestamp') is None:
+        # Without a reading timestamp every delivery looks new
+        return None
+    source = str(data.get('source') or request.headers.get('X-Client-Id') or request.remote_addr or 'unknown')
+    return source, machine_id, timestamp_ms
+
+# Warm-restart snapshots of history, dedupe index and call cooldown (interval 0 disables)
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analytics_state.snap'))
+SNAPSHOT_INTERVAL = float(os.getenv('SNAPSHOT_INTERVAL', 60))
+snapshot_scheduler = SnapshotScheduler(SNAPSHOT_PATH, SNAPSHOT_INTERVAL, sensor_history, dedupe_index, emergency_call_history)
+
+def start_snapshots(use_reloader=False):
+    """Restore the last snapshot and start the snapshot timer in the process that serves requests"""
+    if SNAPSHOT_INTERVAL <= 0:
+        return
+    if use_reloader and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        # The reloader's outer process only watches files; its child serves requests
+        return
+    snapshot_scheduler.restore()
+    snapshot_scheduler.start()
+    # atexit handlers don't run when the process is killed by SIGTERM
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, handle_sigterm)
+
+def handle_sigterm(signum, frame):
+    """Write the final snapshot, then exit"""
+    logger.info("SIGTERM received; writing final snapshot")
+    snapshot_scheduler.stop()
+    sys.exit(0)
+
 def is_in_range(value, range_dict):
     """Check if a value is within the specified range"""
     return range_dict['min'] <= value <= range_dict['max']
@@ -202,10 +273,29 @@ def trigger_emergency_call():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/analyze-sensor-data', methods=['POST'])
+@ingest_limiter.limit
 def analyze_sensor_data():
     """Analyze sensor data and trigger alerts if needed"""
+    dedupe_key = None
     try:
+        # Set by the ingest limiter on arrival so relay latency includes queueing
+        received_at = g.get('received_at', time.perf_counter())
         data = request.get_json()
+        machine_id = str(data.get('machine_id', 'default'))
+        timestamp_ms = parse_timestamp_ms(data.get('timestamp'))
+        
+        # Drop re-delivered (or too old to check) readings before any analysis
+        key = reading_dedupe_key(data, machine_id, timestamp_ms)
+        if key is not None:
+            status = dedupe_index.claim(*key)
+            if status != NEW:
+                return jsonify({
+                    'duplicate': True,
+                    'stale': status == STALE,
+                    'machine_id': machine_id,
+                    'timestamp': datetime.now().isoformat()
+                })
+            dedupe_key = key
         
         # Transform the data to match our expected format
         sensor_data = {
@@ -226,6 +316,13 @@ def analyze_sensor_data():
             anomaly_status['critical_indicators'] >= 2
         )
         
+        # Fast path: cut the relay before recording, notifying or building the response
+        relay_latency_ms = None
+        if should_trigger_call and data.get('relayState', 1) != RELAY_OFF:
+            relay_latency_ms = relay_controller.cut_off(machine_id, received_at)
+        
+        record_reading(machine_id, timestamp_ms, data, sensor_data)
+        
         response_data = {
             'anomaly_status': anomaly_status,
             'sensor_data': sensor_data,
@@ -233,18 +330,69 @@ def analyze_sensor_data():
             'timestamp': datetime.now().isoformat()
         }
         
+        if relay_latency_ms is not None:
+            response_data['relay_cut_off'] = True
+            response_data['relay_latency_ms'] = relay_latency_ms
+        
         # Auto-trigger emergency call if conditions are met
         if should_trigger_call:
             message = f"CRITICAL ALERT: Smart Factory Dashboard detected critical anomalies with {anomaly_status['critical_indicators']} critical indicators."
             success = make_emergency_call(message, anomaly_status['critical_indicators'], anomaly_status['status'])
             response_data['emergency_call_triggered'] = success
         
+        # Only a fully processed reading counts as delivered
+        if dedupe_key is not None:
+            dedupe_index.commit(*dedupe_key)
         return jsonify(response_data)
         
     except Exception as e:
+        if dedupe_key is not None:
+            dedupe_index.release(*dedupe_key)
         logger.error(f"Error analyzing sensor data: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/relay/latency', methods=['GET'])
+def get_relay_latency():
+    """Get reading-to-actuation latency of recent relay cut-offs"""
+    return jsonify(relay_controller.stats())
+
+@app.route('/api/rate-limit/stats', methods=['GET'])
+def get_rate_limit_stats():
+    """Get ingest rate limiter state and rejection counts"""
+    return jsonify(ingest_limiter.stats())
+
+@app.route('/api/dedupe/stats', methods=['GET'])
+def get_dedupe_stats():
+    """Get counts of accepted and suppressed duplicate readings"""
+    return jsonify(dedupe_index.stats())
+
+@app.route('/api/import-csv', methods=['POST'])
+def import_csv():
+    """Import uploaded historical CSV exports into sensor history"""
+    try:
+        uploads = request.files.getlist('files')
+        if not uploads:
+            return jsonify({'success': False, 'error': 'Upload one or more CSV exports as multipart "files"'}), 400
+        machine_id = request.form.get('machine_id', 'default')
+        
+        # Uploads are only ever read from a private temporary directory
+        with tempfile.TemporaryDirectory() as upload_dir:
+            paths = []
+            for i, upload in enumerate(uploads):
+                path = os.path.join(upload_dir, f'upload_{i}.csv')
+                upload.save(path)
+                paths.append(path)
+            summary = import_csv_files(paths, sensor_history, machine_id)
+        
+        return jsonify({'success': True, **summary})
+        
+    except CsvImportError as e:
+        logger.error(f"Error importing CSV: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error importing CSV: {str(e)}")
+        return jsonify({'success': False, 'error': 'CSV import failed'}), 500
+
 @app.route('/api/thresholds', methods=['GET'])
 def get_thresholds():
     """Get current thresholds"""
@@ -265,6 +413,41 @@ def update_thresholds():
         logger.error(f"Error updating thresholds: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """Get recent readings for a machine from the compressed history"""
+    try:
+        machine_id = request.args.get('machine_id', 'default')
+        since = request.args.get('since')
+        limit = request.args.get('limit', type=int)
+        fields = request.args.get('fields')
+        
+        history = sensor_history.query(
+            machine_id,
+            fields=fields.split(',') if fields else None,
+            since_ms=parse_timestamp_strict(since) if since else None,
+            limit=limit
+        )
+        if history is None:
+            return jsonify({'error': f'No history for machine {machine_id}'}), 404
+        
+        return jsonify({
+            'machine_id': machine_id,
+            'count': len(history['timestamp']),
+            'columns': {key: values.tolist() for key, values in history.items()}
+        })
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error reading history: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/history/stats', methods=['GET'])
+def get_history_stats():
+    """Get compressed history size per machine"""
+    return jsonify(sensor_history.stats())
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -275,4 +458,5 @@ def health_check():
     })
 
 if __name__ == '__main__':
+    start_snapshots(use_reloader=True)
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the compressed sensor history codec
+
+Reports compression ratio against raw LiveData-style readings and
+block-wise decode throughput.
+"""
+
+import math
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from timeseries import SENSOR_FIELDS, CompressedSeries
+
+READINGS = 50_000
+INTERVAL_MS = 1000
+
+
+def generate_readings(count):
+    """Generate readings shaped like the frontend's LiveData"""
+    start = datetime(2024, 1, 1)
+    readings = []
+    temperature = 25.0
+    humidity = 60.0
+    for i in range(count):
+        temperature += random.uniform(-0.05, 0.05)
+        humidity += random.uniform(-0.1, 0.1)
+        vib_x = round(random.gauss(0, 2), 2)
+        vib_y = round(random.gauss(0, 2), 2)
+        vib_z = round(random.gauss(9.8, 0.5), 2)
+        readings.append({
+            'decibel': round(55 + 5 * math.sin(i / 300) + random.uniform(-1, 1), 1),
+            'humidity': round(humidity, 1),
+            'relayState': 1,
+            'temperature': round(temperature, 1),
+            'timestamp': (start + timedelta(milliseconds=i * INTERVAL_MS)).isoformat(),
+            'vibration_x': vib_x,
+            'vibration_y': vib_y,
+            'vibration_z': vib_z,
+            'vibration_magnitude': math.sqrt(vib_x ** 2 + vib_y ** 2 + vib_z ** 2),
+            'is_anomaly': 0,
+        })
+    return readings
+
+
+def raw_size(readings):
+    """Approximate memory held by a list of reading dicts"""
+    total = sys.getsizeof(readings)
+    for reading in readings:
+        total += sys.getsizeof(reading)
+        total += sum(sys.getsizeof(value) for value in reading.values())
+    return total
+
+
+def main():
+    print("Generating readings...")
+    readings = generate_readings(READINGS)
+    start_ms = int(datetime(2024, 1, 1).timestamp() * 1000)
+
+    series = CompressedSeries(max_blocks=None)
+    started = time.perf_counter()
+    for i, reading in enumerate(readings):
+        series.append(start_ms + i * INTERVAL_MS, reading)
+    series.seal()
+    encode_seconds = time.perf_counter() - started
+
+    raw_bytes = raw_size(readings)
+    packed_bytes = series.nbytes
+    raw_bytes_per_value = READINGS * (len(SENSOR_FIELDS) + 1) * 8
+
+    started = time.perf_counter()
+    decoded = series.to_numpy()
+    decode_seconds = time.perf_counter() - started
+
+    assert len(decoded['timestamp']) == READINGS
+
+    print("=" * 50)
+    print(f"Readings:                 {READINGS}")
+    print(f"Raw reading dicts:        {raw_bytes / 1024:.1f} KiB")
+    print(f"Raw float64 columns:      {raw_bytes_per_value / 1024:.1f} KiB")
+    print(f"Compressed blocks:        {packed_bytes / 1024:.1f} KiB ({len(series.blocks)} blocks)")
+    print(f"Ratio vs reading dicts:   {raw_bytes / packed_bytes:.1f}x")
+    print(f"Ratio vs float64 columns: {raw_bytes_per_value / packed_bytes:.1f}x")
+    print(f"Encode throughput:        {READINGS / encode_seconds:,.0f} readings/s")
+    print(f"Decode throughput:        {READINGS / decode_seconds:,.0f} readings/s")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
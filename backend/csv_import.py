@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Parallel bulk import of historical CSV exports
+
+Reads files in the layout written by the dashboard's "Export CSV" button.
+Each file is split into byte ranges aligned to line boundaries, and worker
+processes parse the ranges into columnar NumPy arrays. The main process
+dedupes on timestamp and keeps only as many of the newest readings as the
+sensor history can retain, so memory stays bounded regardless of input
+size. Workers also encode the final blocks.
+"""
+
+import argparse
+import csv
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+from timeseries import Block, decode_view, encode_timestamps, encode_values, parse_timestamp_strict
+
+logger = logging.getLogger(__name__)
+
+# Header names written by Historical.tsx exportData, mapped to history fields
+CSV_COLUMNS = {
+    'Timestamp': 'timestamp',
+    'Temperature (°C)': 'temperature',
+    'Humidity (%)': 'humidity',
+    'Sound Level (dB)': 'decibel',
+    'Vibration X (m/s²)': 'vibration_x',
+    'Vibration Y (m/s²)': 'vibration_y',
+    'Vibration Z (m/s²)': 'vibration_z',
+    'Vibration Magnitude (m/s²)': 'vibration_magnitude',
+    'Relay State': 'relayState',
+}
+
+DEFAULT_CHUNK_BYTES = 32 * 1024 * 1024
+
+# (history, machine_id) -> [lock, holders]; entries are dropped when no import holds them
+_import_locks = {}
+_import_locks_guard = threading.Lock()
+
+
+class CsvImportError(Exception):
+    """Raised when a file is not a dashboard CSV export"""
+
+
+def read_column_map(path, fields):
+    """Map each history field to its column index in `path` (None if absent)"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        header = next(csv.reader(f), None)
+    if not header:
+        raise CsvImportError(f"Empty file: {os.path.basename(path)}")
+    names = [CSV_COLUMNS.get(name.strip()) for name in header]
+    if 'timestamp' not in names:
+        raise CsvImportError(f"No Timestamp column in {os.path.basename(path)}")
+    return names.index('timestamp'), [names.index(field) if field in names else None for field in fields]
+
+
+def split_ranges(path, chunk_bytes):
+    """Split a file into (start, end) byte ranges of roughly `chunk_bytes`"""
+    size = os.path.getsize(path)
+    return [(start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)]
+
+
+def _parse_range(path, start, end, ts_index, column_indexes):
+    """Parse the lines starting inside [start, end) into sorted, deduped columnar arrays"""
+    timestamps = []
+    rows = []
+    skipped = 0
+    with open(path, 'rb') as f:
+        if start > 0:
+            # A line that began before `start` belongs to the previous range
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            text = line.decode('utf-8-sig').rstrip('\r\n')
+            if not text or text.startswith('Timestamp'):
+                continue
+            cells = text.split(',')
+            try:
+                timestamps.append(parse_timestamp_strict(cells[ts_index]))
+                rows.append([float(cells[i]) if i is not None else 0.0 for i in column_indexes])
+            except (IndexError, ValueError):
+                if len(timestamps) > len(rows):
+                    timestamps.pop()
+                skipped += 1
+
+    ts_array = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(rows, dtype=np.float64).reshape(len(rows), len(column_indexes))
+    ts_array, first = np.unique(ts_array, return_index=True)
+    return ts_array, values[first], len(rows), skipped
+
+
+def _encode_block(timestamps, values):
+    """Encode one block from a timestamp array and a (rows, fields) value array"""
+    timestamps = timestamps.tolist()
+    return Block(
+        count=len(timestamps),
+        start_ms=timestamps[0],
+        end_ms=timestamps[-1],
+        timestamps=encode_timestamps(timestamps),
+        columns=[encode_values(values[:, i].tolist()) for i in range(values.shape[1])],
+    )
+
+
+def _merge_newest(ts_a, values_a, ts_b, values_b, capacity):
+    """Merge two sorted column sets, keeping the first copy of each timestamp and the newest `capacity` rows"""
+    timestamps = np.concatenate([ts_a, ts_b])
+    values = np.concatenate([values_a, values_b])
+    timestamps, first = np.unique(timestamps, return_index=True)
+    values = values[first]
+    if capacity is not None and len(timestamps) > capacity:
+        timestamps = timestamps[-capacity:]
+        values = values[-capacity:]
+    return timestamps, values
+
+
+@contextmanager
+def _machine_import_lock(history, machine_id):
+    """Serialise imports into the same machine's history"""
+    key = (id(history), machine_id)
+    with _import_locks_guard:
+        entry = _import_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _import_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _import_locks[key]
+
+
+def import_csv_files(paths, history, machine_id='default', workers=None, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Import dashboard CSV exports into `history` for one machine; return a summary dict
+
+    Imports for the same machine run one at a time, so each merges on top of
+    the previous one instead of replacing it.
+    """
+    with _machine_import_lock(history, machine_id):
+        return _import_locked(paths, history, machine_id, workers, chunk_bytes)
+
+
+def _import_locked(paths, history, machine_id, workers, chunk_bytes):
+    started = time.perf_counter()
+    fields = history.fields
+    capacity = history.block_size * history.max_blocks if history.max_blocks else None
+    workers = workers or os.cpu_count() or 1
+
+    # Existing readings take part in the timestamp dedupe; readings posted
+    # after this point are merged back in when the history is replaced
+    with history.lock:
+        existing = history.series.get(machine_id)
+        view = existing.view() if existing is not None else None
+        copy_point = existing.appended if existing is not None else 0
+    if view is not None:
+        current = decode_view(fields, view)
+        merged_ts = current['timestamp']
+        merged_values = np.column_stack([current[field] for field in fields])
+    else:
+        merged_ts = np.empty(0, dtype=np.int64)
+        merged_values = np.empty((0, len(fields)), dtype=np.float64)
+    existing_count = len(merged_ts)
+
+    parsed = 0
+    skipped = 0
+    total_bytes = 0
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        tasks = []
+        for path in paths:
+            ts_index, column_indexes = read_column_map(path, fields)
+            total_bytes += os.path.getsize(path)
+            tasks.extend((path, start, end, ts_index, column_indexes) for start, end in split_ranges(path, chunk_bytes))
+
+        # Keep a bounded number of ranges in flight so parsed arrays don't pile up
+        pending = []
+        for task in tasks:
+            pending.append(pool.submit(_parse_range, *task))
+            if len(pending) >= workers * 2:
+                ts_chunk, values_chunk, chunk_parsed, chunk_skipped = pending.pop(0).result()
+                parsed += chunk_parsed
+                skipped += chunk_skipped
+                merged_ts, merged_values = _merge_newest(merged_ts, merged_values, ts_chunk, values_chunk, capacity)
+        for future in pending:
+            ts_chunk, values_chunk, chunk_parsed, chunk_skipped = future.result()
+            parsed += chunk_parsed
+            skipped += chunk_skipped
+            merged_ts, merged_values = _merge_newest(merged_ts, merged_values, ts_chunk, values_chunk, capacity)
+
+        # Encode full blocks in parallel; the remainder becomes the uncompressed head
+        block_size = history.block_size
+        sealed = len(merged_ts) - len(merged_ts) % block_size
+        futures = [
+            pool.submit(_encode_block, merged_ts[i:i + block_size], merged_values[i:i + block_size])
+            for i in range(0, sealed, block_size)
+        ]
+        blocks = [future.result() for future in futures]
+
+    with history.lock:
+        series = history._series_for(machine_id)
+        live_count = series.appended - copy_point
+        live = decode_view(fields, series.view(), limit=live_count) if live_count else None
+        series.replace(
+            blocks,
+            merged_ts[sealed:].tolist(),
+            [merged_values[sealed:, i].tolist() for i in range(len(fields))]
+        )
+        # Re-append readings that arrived while the import was running
+        if live is not None:
+            keep = ~np.isin(live['timestamp'], merged_ts)
+            for i in np.flatnonzero(keep):
+                series.append(int(live['timestamp'][i]), {field: live[field][i] for field in fields})
+            live_count = int(keep.sum())
+        readings_after = len(series)
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        'machine_id': machine_id,
+        'files': len(paths),
+        'bytes': total_bytes,
+        'rows_parsed': parsed,
+        'rows_skipped': skipped,
+        'readings_before': existing_count,
+        'readings_live': live_count,
+        'readings_after': readings_after,
+        'seconds': round(elapsed, 3),
+    }
+    logger.info(f"CSV import finished: {summary}")
+    return summary
+
+
+def main():
+    """Import CSV exports into the snapshot file so the backend loads them on its next start"""
+    from dedupe import DedupeIndex
+    from snapshot import load_snapshot, write_snapshot
+    from timeseries import SensorHistory
+
+    parser = argparse.ArgumentParser(description="Import dashboard CSV exports into the backend's sensor history. Stop the backend first: it overwrites the snapshot on its own timer.")
+    parser.add_argument('paths', nargs='+', help="CSV files written by the dashboard's Export CSV button")
+    parser.add_argument('--machine-id', default='default', help="Machine the readings belong to")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--chunk-mb', type=int, default=DEFAULT_CHUNK_BYTES // (1024 * 1024), help="Bytes per parse task in MiB")
+    parser.add_argument('--snapshot', default=os.getenv('SNAPSHOT_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analytics_state.snap')),
+                        help="Snapshot file to update")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    history, dedupe, call_history = SensorHistory(), DedupeIndex(), {}
+    load_snapshot(args.snapshot, history, dedupe, call_history)
+    try:
+        summary = import_csv_files(args.paths, history, args.machine_id, args.workers, args.chunk_mb * 1024 * 1024)
+    except (CsvImportError, OSError) as e:
+        print(f"❌ Import failed: {str(e)}")
+        return False
+    write_snapshot(args.snapshot, history, dedupe, call_history)
+
+    print(f"✅ Imported {summary['rows_parsed']} rows ({summary['rows_skipped']} skipped) in {summary['seconds']} s")
+    print(f"   {summary['readings_after']} readings retained for {summary['machine_id']}; snapshot written to {args.snapshot}")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
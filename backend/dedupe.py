@@ -0,0 +1,145 @@
+"""
+Duplicate reading suppression for idempotent ingest
+
+Readings are keyed by (source, machine, timestamp). Each (source, machine)
+stream keeps its timestamps in time buckets; a stream's oldest buckets are
+evicted first, and the least recently active streams give way when the
+index as a whole is full, so memory stays bounded. Evicting a bucket raises
+that stream's low-water mark, and the stream's readings older than it are
+suppressed as stale, because a replay of old history can no longer be told
+apart from a first delivery. Other streams are unaffected, so one machine
+with a skewed clock cannot make every other machine's readings stale.
+
+A reading is claimed before analysis and only recorded once it has been
+processed, so a failed attempt can be retried by the gateway.
+"""
+
+import threading
+from collections import OrderedDict
+
+DEFAULT_BUCKET_MS = 60_000
+DEFAULT_MAX_BUCKETS = 60
+DEFAULT_MAX_ENTRIES = 200_000
+DEFAULT_MAX_STREAMS = 10_000
+
+NEW = 'new'
+DUPLICATE = 'duplicate'
+STALE = 'stale'
+
+
+class DedupeStream:
+    """Time buckets of recently seen timestamps for one (source, machine) pair"""
+
+    __slots__ = ('buckets', 'horizon_ms')
+
+    def __init__(self, buckets=None, horizon_ms=None):
+        self.buckets = OrderedDict() if buckets is None else buckets
+        self.horizon_ms = horizon_ms
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+
+class DedupeIndex:
+    """Per-stream time-bucketed sets of recently seen reading keys, each with a low-water mark"""
+
+    def __init__(self, bucket_ms=DEFAULT_BUCKET_MS, max_buckets=DEFAULT_MAX_BUCKETS,
+                 max_entries=DEFAULT_MAX_ENTRIES, max_streams=DEFAULT_MAX_STREAMS):
+        self.bucket_ms = bucket_ms
+        self.max_buckets = max_buckets
+        self.max_entries = max_entries
+        self.max_streams = max_streams
+        self.streams = OrderedDict()
+        self.pending = set()
+        self.entries = 0
+        self.accepted = 0
+        self.suppressed = 0
+        self.stale = 0
+        self.lock = threading.Lock()
+
+    def claim(self, source, machine_id, timestamp_ms):
+        """Classify a reading as NEW, DUPLICATE or STALE; NEW readings are held until commit() or release()"""
+        key = (source, machine_id, timestamp_ms)
+        with self.lock:
+            stream = self.streams.get((source, machine_id))
+            if stream is not None:
+                if stream.horizon_ms is not None and timestamp_ms < stream.horizon_ms:
+                    self.stale += 1
+                    return STALE
+                bucket = stream.buckets.get(timestamp_ms // self.bucket_ms)
+                if bucket is not None and timestamp_ms in bucket:
+                    self.suppressed += 1
+                    return DUPLICATE
+            if key in self.pending:
+                self.suppressed += 1
+                return DUPLICATE
+            self.pending.add(key)
+            return NEW
+
+    def release(self, source, machine_id, timestamp_ms):
+        """Forget a claimed reading that failed processing, so a retry is accepted"""
+        with self.lock:
+            self.pending.discard((source, machine_id, timestamp_ms))
+
+    def commit(self, source, machine_id, timestamp_ms):
+        """Record a claimed reading as processed"""
+        with self.lock:
+            self.pending.discard((source, machine_id, timestamp_ms))
+            self._add((source, machine_id), timestamp_ms)
+            self.accepted += 1
+
+    def _stream_for(self, stream_key):
+        stream = self.streams.get(stream_key)
+        if stream is None:
+            stream = DedupeStream()
+            self.streams[stream_key] = stream
+            if len(self.streams) > self.max_streams:
+                _, evicted = self.streams.popitem(last=False)
+                self.entries -= len(evicted)
+        else:
+            self.streams.move_to_end(stream_key)
+        return stream
+
+    def _add(self, stream_key, timestamp_ms):
+        stream = self._stream_for(stream_key)
+        bucket_id = timestamp_ms // self.bucket_ms
+        bucket = stream.buckets.get(bucket_id)
+        if bucket is None:
+            bucket = set()
+            stream.buckets[bucket_id] = bucket
+            if len(stream.buckets) > 1 and bucket_id < next(reversed(stream.buckets)):
+                # Keep buckets ordered by time so eviction drops the oldest
+                stream.buckets = OrderedDict(sorted(stream.buckets.items()))
+        if timestamp_ms not in bucket:
+            bucket.add(timestamp_ms)
+            self.entries += 1
+
+        while len(stream.buckets) > self.max_buckets:
+            self._evict_oldest(stream)
+        # Over the global cap, trim the least recently active streams first
+        while self.entries > self.max_entries:
+            oldest_key, oldest = next(iter(self.streams.items()))
+            self._evict_oldest(oldest)
+            if not oldest.buckets:
+                if oldest is stream:
+                    break
+                # Nothing left to check against; the stream is forgotten along with its mark
+                del self.streams[oldest_key]
+
+    def _evict_oldest(self, stream):
+        evicted_id, evicted = stream.buckets.popitem(last=False)
+        self.entries -= len(evicted)
+        horizon = (evicted_id + 1) * self.bucket_ms
+        stream.horizon_ms = horizon if stream.horizon_ms is None else max(stream.horizon_ms, horizon)
+
+    def stats(self):
+        """Summarise accepted, duplicate and stale readings and index size"""
+        with self.lock:
+            return {
+                'accepted': self.accepted,
+                'suppressed': self.suppressed,
+                'stale': self.stale,
+                'entries': self.entries,
+                'streams': len(self.streams),
+                'buckets': sum(len(stream.buckets) for stream in self.streams.values()),
+            }
@@ -0,0 +1,150 @@
+"""
+Ingest rate limiting with explicit backpressure
+
+Per-client and per-machine token buckets reject floods before any work is
+done, and a global concurrency gate with a bounded wait queue keeps one
+noisy source from starving the others. Rejections are answered with a
+prebuilt 429 body and a Retry-After header.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, request
+
+REJECT_BODY = b'{"error": "rate limit exceeded"}'
+BUSY_BODY = b'{"error": "server busy"}'
+
+
+class TokenBucket:
+    """Classic token bucket refilled at `rate` tokens per second up to `burst`"""
+
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, burst, now):
+        self.tokens = burst
+        self.updated = now
+
+
+class BucketTable:
+    """Token buckets keyed by source, bounded by evicting the least recently used"""
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def acquire(self, key):
+        """Take one token for `key`; return 0 if allowed, else seconds until a token is available"""
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.burst, now)
+                self.buckets[key] = bucket
+                if len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+                bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+                bucket.updated = now
+
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return 0
+            return (1 - bucket.tokens) / self.rate
+
+
+class ConcurrencyGate:
+    """Caps requests in flight; a bounded number may wait briefly for a slot"""
+
+    def __init__(self, max_active, max_waiting, wait_timeout):
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.active = 0
+        self.waiting = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """Return True once a slot is held, False if the queue is full or the wait timed out"""
+        with self.condition:
+            if self.active < self.max_active:
+                self.active += 1
+                return True
+            if self.waiting >= self.max_waiting:
+                return False
+            self.waiting += 1
+            try:
+                acquired = self.condition.wait_for(lambda: self.active < self.max_active, self.wait_timeout)
+            finally:
+                self.waiting -= 1
+            if acquired:
+                self.active += 1
+            return acquired
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+
+class IngestLimiter:
+    """Combines per-client and per-machine buckets with the concurrency gate"""
+
+    def __init__(self, client_rate, client_burst, machine_rate, machine_burst,
+                 max_active, max_waiting, wait_timeout):
+        self.clients = BucketTable(client_rate, client_burst)
+        self.machines = BucketTable(machine_rate, machine_burst)
+        self.gate = ConcurrencyGate(max_active, max_waiting, wait_timeout)
+        self.rejected = {'client': 0, 'machine': 0, 'busy': 0}
+        self.lock = threading.Lock()
+
+    def _reject(self, reason, retry_after, body=REJECT_BODY):
+        with self.lock:
+            self.rejected[reason] += 1
+        headers = {'Retry-After': str(max(1, math.ceil(retry_after))), 'Content-Type': 'application/json'}
+        return body, 429, headers
+
+    def limit(self, view):
+        """Decorator applying the limits to a Flask view"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Arrival time for latency measurements, taken before any queueing for the gate
+            g.received_at = time.perf_counter()
+            client_id = request.headers.get('X-Client-Id') or request.remote_addr or 'unknown'
+            retry_after = self.clients.acquire(client_id)
+            if retry_after:
+                return self._reject('client', retry_after)
+
+            # Same key the view stores the reading under, so a client cannot dodge it with a header
+            body = request.get_json(silent=True)
+            machine_id = str(body.get('machine_id', 'default')) if isinstance(body, dict) else 'default'
+            retry_after = self.machines.acquire(machine_id)
+            if retry_after:
+                return self._reject('machine', retry_after)
+
+            if not self.gate.acquire():
+                return self._reject('busy', self.gate.wait_timeout, BUSY_BODY)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                self.gate.release()
+        return wrapper
+
+    def stats(self):
+        """Summarise limiter state and rejection counts"""
+        with self.lock:
+            rejected = dict(self.rejected)
+        return {
+            'rejected': rejected,
+            'active': self.gate.active,
+            'waiting': self.gate.waiting,
+            'tracked_clients': len(self.clients.buckets),
+            'tracked_machines': len(self.machines.buckets),
+        }
@@ -0,0 +1,377 @@
+"""
+Warm-restart snapshots of in-memory analytics state
+
+Sensor history, the duplicate-reading index and the emergency call cooldown
+are written to a compact, versioned binary file on a timer and at shutdown.
+On startup the file is memory-mapped and parsed in place, so a restart
+resumes with full context instead of starting cold.
+
+Layout (big-endian): a header of magic, format version, creation time and
+section count, followed by tagged, length-prefixed sections. Sections with
+unknown tags are skipped.
+"""
+
+import atexit
+import itertools
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+
+from dedupe import DedupeStream
+from timeseries import Block, encode_block
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SFSN'
+FORMAT_VERSION = 4
+
+_HEADER = struct.Struct('>4sHqH')
+_SECTION = struct.Struct('>4sQ')
+_BLOCK = struct.Struct('>Iqq')
+
+
+class SnapshotFormatError(Exception):
+    """Raised when a snapshot file cannot be parsed"""
+
+
+@lru_cache(maxsize=None)
+def _struct(fmt):
+    return struct.Struct('>' + fmt)
+
+
+class _Writer:
+    def __init__(self):
+        self.parts = []
+
+    def pack(self, fmt, *values):
+        self.parts.append(_struct(fmt).pack(*values))
+
+    def string(self, value):
+        encoded = str(value).encode('utf-8')
+        self.pack('H', len(encoded))
+        self.parts.append(encoded)
+
+    def blob(self, value):
+        self.pack('I', len(value))
+        self.parts.append(value)
+
+    def getvalue(self):
+        return b''.join(self.parts)
+
+
+class _Reader:
+    def __init__(self, buffer, offset, end):
+        self.buffer = buffer
+        self.offset = offset
+        self.end = end
+
+    def unpack(self, fmt):
+        fmt = _struct(fmt)
+        if self.offset + fmt.size > self.end:
+            raise SnapshotFormatError("Truncated section")
+        values = fmt.unpack_from(self.buffer, self.offset)
+        self.offset += fmt.size
+        return values
+
+    def string(self):
+        (length,) = self.unpack('H')
+        return self.blob_of(length).decode('utf-8')
+
+    def blob(self):
+        (length,) = self.unpack('I')
+        return self.blob_of(length)
+
+    def blob_of(self, length):
+        if self.offset + length > self.end:
+            raise SnapshotFormatError("Truncated section")
+        value = bytes(self.buffer[self.offset:self.offset + length])
+        self.offset += length
+        return value
+
+
+def _write_block(writer, block):
+    writer.parts.append(_BLOCK.pack(block.count, block.start_ms, block.end_ms))
+    writer.blob(block.timestamps)
+    for column in block.columns:
+        writer.blob(column)
+
+
+def _read_block(reader, field_count):
+    count, start_ms, end_ms = reader.unpack('Iqq')
+    timestamps = reader.blob()
+    columns = [reader.blob() for _ in range(field_count)]
+    return Block(count, start_ms, end_ms, timestamps, columns)
+
+
+def _encode_history(history):
+    # Take cheap views under the lock; the head is compressed outside it
+    with history.lock:
+        fields = history.fields
+        views = [(machine_id, series.view()) for machine_id, series in history.series.items()]
+
+    writer = _Writer()
+    writer.pack('H', len(fields))
+    for field in fields:
+        writer.string(field)
+    writer.pack('I', len(views))
+    for machine_id, (blocks, head_timestamps, head_columns) in views:
+        writer.string(machine_id)
+        writer.pack('I', len(blocks))
+        for block in blocks:
+            _write_block(writer, block)
+        writer.pack('?', bool(head_timestamps))
+        if head_timestamps:
+            _write_block(writer, encode_block(head_timestamps, head_columns))
+    return writer.getvalue()
+
+
+def _decode_history(reader, history):
+    """Parse a HIST section into {machine_id: (blocks, head_timestamps, head_columns)}"""
+    (field_count,) = reader.unpack('H')
+    fields = tuple(reader.string() for _ in range(field_count))
+    if fields != history.fields:
+        logger.warning("Snapshot history fields differ from current fields; skipping history")
+        return None
+    (machine_count,) = reader.unpack('I')
+    machines = {}
+    for _ in range(machine_count):
+        machine_id = reader.string()
+        (block_count,) = reader.unpack('I')
+        blocks = [_read_block(reader, field_count) for _ in range(block_count)]
+        head_timestamps, head_columns = [], [[] for _ in fields]
+        (has_head,) = reader.unpack('?')
+        if has_head:
+            timestamps, columns = _read_block(reader, field_count).decode()
+            head_timestamps, head_columns = timestamps.tolist(), [column.tolist() for column in columns]
+        machines[machine_id] = (blocks, head_timestamps, head_columns)
+    return machines
+
+
+def _apply_history(machines, history):
+    with history.lock:
+        for machine_id, (blocks, head_timestamps, head_columns) in machines.items():
+            history._series_for(machine_id).replace(blocks, head_timestamps, head_columns)
+
+
+def _encode_dedupe(dedupe):
+    # Copy each stream's timestamps under the lock; packing happens outside it
+    with dedupe.lock:
+        counters = (dedupe.bucket_ms, dedupe.accepted, dedupe.suppressed, dedupe.stale, len(dedupe.streams))
+        streams = [
+            (stream_key, stream.horizon_ms,
+             np.fromiter(itertools.chain.from_iterable(stream.buckets.values()), dtype=np.int64, count=len(stream)))
+            for stream_key, stream in dedupe.streams.items()
+        ]
+
+    writer = _Writer()
+    writer.pack('qQQQI', *counters)
+    for (source, machine_id), horizon_ms, timestamps in streams:
+        writer.string(source)
+        writer.string(machine_id)
+        writer.pack('q', -1 if horizon_ms is None else horizon_ms)
+        writer.blob(np.sort(timestamps).astype('>i8').tobytes())
+    return writer.getvalue()
+
+
+def _decode_dedupe(reader, dedupe):
+    """Parse a DEDU section into a dict of counters and {(source, machine_id): DedupeStream}"""
+    bucket_ms, accepted, suppressed, stale, stream_count = reader.unpack('qQQQI')
+    if bucket_ms != dedupe.bucket_ms:
+        logger.warning("Snapshot dedupe bucket size differs; skipping dedupe index")
+        return None
+    streams = {}
+    for _ in range(stream_count):
+        source = reader.string()
+        machine_id = reader.string()
+        (horizon_ms,) = reader.unpack('q')
+        blob = reader.blob()
+        if len(blob) % 8:
+            raise SnapshotFormatError("Malformed dedupe timestamps")
+        # Timestamps are stored sorted, so buckets come out in time order
+        timestamps = np.frombuffer(blob, dtype='>i8').astype(np.int64)
+        buckets = OrderedDict()
+        for bucket_id, timestamp_ms in zip((timestamps // bucket_ms).tolist(), timestamps.tolist()):
+            bucket = buckets.get(bucket_id)
+            if bucket is None:
+                buckets[bucket_id] = bucket = set()
+            bucket.add(timestamp_ms)
+        streams[(source, machine_id)] = DedupeStream(buckets, horizon_ms if horizon_ms >= 0 else None)
+    return {
+        'accepted': accepted,
+        'suppressed': suppressed,
+        'stale': stale,
+        'streams': streams,
+    }
+
+
+def _apply_dedupe(state, dedupe):
+    with dedupe.lock:
+        dedupe.accepted += state['accepted']
+        dedupe.suppressed += state['suppressed']
+        dedupe.stale += state['stale']
+        for stream_key, restored in state['streams'].items():
+            stream = dedupe.streams.get(stream_key)
+            if stream is None:
+                dedupe.streams[stream_key] = restored
+                continue
+            if restored.horizon_ms is not None:
+                stream.horizon_ms = restored.horizon_ms if stream.horizon_ms is None else max(stream.horizon_ms, restored.horizon_ms)
+            for bucket_id, timestamps in restored.buckets.items():
+                stream.buckets.setdefault(bucket_id, set()).update(timestamps)
+            stream.buckets = OrderedDict(sorted(stream.buckets.items()))
+        dedupe.entries = sum(len(stream) for stream in dedupe.streams.values())
+
+
+def _encode_escalation(call_history):
+    writer = _Writer()
+    last_call_time = call_history.get('last_call_time')
+    writer.pack('q', int(last_call_time.timestamp() * 1000) if last_call_time else -1)
+    writer.string(call_history.get('call_sid') or '')
+    return writer.getvalue()
+
+
+def _decode_escalation(reader, call_history):
+    """Parse an ESCL section into the emergency call history entries it holds"""
+    (last_call_ms,) = reader.unpack('q')
+    call_sid = reader.string()
+    state = {}
+    if last_call_ms >= 0:
+        state['last_call_time'] = datetime.fromtimestamp(last_call_ms / 1000)
+    if call_sid:
+        state['call_sid'] = call_sid
+    return state
+
+
+def _apply_escalation(state, call_history):
+    call_history.update(state)
+
+
+def write_snapshot(path, history, dedupe, call_history):
+    """Write analytics state to `path` atomically; return the number of bytes written"""
+    sections = [
+        (b'HIST', _encode_history(history)),
+        (b'DEDU', _encode_dedupe(dedupe)),
+        (b'ESCL', _encode_escalation(call_history)),
+    ]
+    parts = [_HEADER.pack(MAGIC, FORMAT_VERSION, int(time.time() * 1000), len(sections))]
+    for tag, payload in sections:
+        parts.append(_SECTION.pack(tag, len(payload)))
+        parts.append(payload)
+    data = b''.join(parts)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def load_snapshot(path, history, dedupe, call_history):
+    """Restore analytics state from `path`; return False if there is no usable snapshot
+
+    The whole file is parsed before any live state is touched, so a corrupt
+    or truncated snapshot raises without leaving state half restored.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) < _HEADER.size:
+        return False
+
+    sections = {
+        b'HIST': (lambda reader: _decode_history(reader, history), lambda parsed: _apply_history(parsed, history)),
+        b'DEDU': (lambda reader: _decode_dedupe(reader, dedupe), lambda parsed: _apply_dedupe(parsed, dedupe)),
+        b'ESCL': (lambda reader: _decode_escalation(reader, call_history), lambda parsed: _apply_escalation(parsed, call_history)),
+    }
+    parsed = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        magic, version, created_ms, section_count = _HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise SnapshotFormatError(f"Not a snapshot file: {path}")
+        if version != FORMAT_VERSION:
+            logger.warning(f"Ignoring snapshot with format version {version} (expected {FORMAT_VERSION})")
+            return False
+
+        offset = _HEADER.size
+        for _ in range(section_count):
+            if offset + _SECTION.size > len(buffer):
+                raise SnapshotFormatError("Truncated snapshot")
+            tag, length = _SECTION.unpack_from(buffer, offset)
+            offset += _SECTION.size
+            if offset + length > len(buffer):
+                raise SnapshotFormatError("Truncated snapshot")
+            if tag in sections:
+                decode, apply = sections[tag]
+                state = decode(_Reader(buffer, offset, offset + length))
+                if state is not None:
+                    parsed.append((apply, state))
+            offset += length
+
+    for apply, state in parsed:
+        apply(state)
+
+    logger.info(f"Restored analytics snapshot from {datetime.fromtimestamp(created_ms / 1000).isoformat()}")
+    return True
+
+
+class SnapshotScheduler:
+    """Writes snapshots on a fixed interval and once more at shutdown"""
+
+    def __init__(self, path, interval, history, dedupe, call_history):
+        self.path = path
+        self.interval = interval
+        self.state = (history, dedupe, call_history)
+        self.stop_event = threading.Event()
+        self.write_lock = threading.Lock()
+        self.thread = None
+        self.last_written = None
+
+    def restore(self):
+        """Load the snapshot if one exists; errors are logged and startup continues cold"""
+        started = time.perf_counter()
+        try:
+            restored = load_snapshot(self.path, *self.state)
+        except (SnapshotFormatError, struct.error, UnicodeDecodeError, OSError) as e:
+            logger.error(f"Error restoring snapshot: {str(e)}")
+            return False
+        if restored:
+            logger.info(f"Snapshot restored in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return restored
+
+    def snapshot(self):
+        """Write a snapshot now"""
+        # The timer and a shutdown signal can both write; they share the temporary file
+        with self.write_lock:
+            try:
+                size = write_snapshot(self.path, *self.state)
+                self.last_written = datetime.now()
+                return size
+            except OSError as e:
+                logger.error(f"Error writing snapshot: {str(e)}")
+                return None
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.snapshot()
+
+    def start(self):
+        """Start the background timer and register the shutdown snapshot"""
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._run, name='snapshot-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the timer and write a final snapshot; later calls do nothing"""
+        if self.stop_event.is_set():
+            return
+        self.stop_event.set()
+        self.snapshot()
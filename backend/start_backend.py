@@ -14,6 +14,7 @@ def check_dependencies():
         import flask
         import flask_cors
         import twilio
+        import numpy
         print("✅ All dependencies are installed")
         return True
     except ImportError as e:
@@ -36,7 +37,7 @@ def start_server():
     
     try:
         # Start the Flask app
-        from app import app
+        from app import app, start_snapshots
         print("✅ Flask app imported successfully")
         print("🌐 Server will be available at: http://localhost:5000")
         print("📋 API Endpoints:")
@@ -45,11 +46,18 @@ def start_server():
         print("   - PUT  /api/thresholds")
         print("   - POST /api/emergency-call")
         print("   - POST /api/analyze-sensor-data")
+        print("   - GET  /api/history")
+        print("   - GET  /api/history/stats")
+        print("   - GET  /api/relay/latency")
+        print("   - GET  /api/rate-limit/stats")
+        print("   - GET  /api/dedupe/stats")
+        print("   - POST /api/import-csv")
         print()
         print("Press Ctrl+C to stop the server")
         print("=" * 50)
         
         # Run the app
+        start_snapshots(use_reloader=True)
         app.run(debug=True, host='0.0.0.0', port=5000)
         
     except KeyboardInterrupt:
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Round-trip checks for the compressed sensor history codec
+"""
+
+import math
+import random
+import struct
+
+import numpy as np
+
+from timeseries import (
+    CompressedSeries, SensorHistory, decode_timestamps, decode_values, encode_timestamps, encode_values
+)
+
+
+def bits_of(value):
+    return struct.unpack('>Q', struct.pack('>d', value))[0]
+
+
+def check_timestamps(timestamps):
+    decoded = decode_timestamps(encode_timestamps(timestamps), len(timestamps))
+    assert decoded.tolist() == timestamps, f"timestamps differ: {timestamps[:5]}..."
+
+
+def check_values(values):
+    decoded = decode_values(encode_values(values), len(values))
+    assert [bits_of(v) for v in decoded.tolist()] == [bits_of(v) for v in values], f"values differ: {values[:5]}..."
+
+
+def test_timestamp_buckets():
+    """Test delta-of-deltas in every control bucket, including the 64-bit escape"""
+    print("Testing timestamp buckets...")
+    base = 1_700_000_000_000
+    check_timestamps([])
+    check_timestamps([base])
+    check_timestamps([-base])
+    check_timestamps([base, base + 1000, base + 2000, base + 3000])
+    for dod in (1, -1, 63, -63, 64, -64, 255, -255, 256, -256, 2047, -2047, 2048, -2048, 10**9, -10**9):
+        check_timestamps([base, base + 1000, base + 2000 + dod, base + 3000 + dod])
+    check_timestamps([0, 2**62, -2**62, 2**62])
+    check_timestamps([base, base, base, base + 1])
+    print("OK")
+    print()
+
+
+def test_special_values():
+    """Test signed zeros, infinities, NaN and single-value blocks"""
+    print("Testing special float values...")
+    check_values([])
+    check_values([0.0])
+    check_values([-0.0])
+    check_values([math.inf])
+    check_values([0.0, -0.0, 0.0, -0.0])
+    check_values([1.5, math.inf, -math.inf, math.nan, 1.5])
+    check_values([5e-324, -5e-324, 1.7976931348623157e308, -1.7976931348623157e308])
+    check_values([25.0] * 10)
+    print("OK")
+    print()
+
+
+def test_random_round_trip():
+    """Test random timestamp and value sequences"""
+    print("Testing random sequences...")
+    rng = random.Random(1234)
+    for _ in range(200):
+        count = rng.randint(1, 300)
+        ts = rng.randint(0, 2**41)
+        timestamps = []
+        for _ in range(count):
+            ts += rng.choice([1000, 1000, 1000, rng.randint(-5000, 5000), rng.randint(-2**40, 2**40)])
+            timestamps.append(ts)
+        check_timestamps(timestamps)
+
+        value = rng.uniform(-100, 100)
+        values = []
+        for _ in range(count):
+            value = rng.choice([value, round(value + rng.uniform(-1, 1), 2), rng.uniform(-1e6, 1e6)])
+            values.append(value)
+        check_values(values)
+    print("OK")
+    print()
+
+
+def test_series_query():
+    """Test sealed blocks plus head, `since` and `limit`"""
+    print("Testing series queries...")
+    series = CompressedSeries(fields=('a', 'b'), block_size=8, max_blocks=None)
+    for i in range(21):
+        series.append(1000 * i, {'a': float(i), 'b': -float(i)})
+    everything = series.to_numpy()
+    assert everything['timestamp'].tolist() == [1000 * i for i in range(21)]
+    assert np.array_equal(everything['b'], -everything['a'])
+
+    newest = series.to_numpy(fields=['a'], limit=3)
+    assert newest['a'].tolist() == [18.0, 19.0, 20.0]
+    assert set(newest) == {'timestamp', 'a'}
+    assert len(series.to_numpy(limit=0)['timestamp']) == 0
+    assert series.to_numpy(since_ms=15_000)['timestamp'].tolist() == [15_000, 16_000, 17_000, 18_000, 19_000, 20_000]
+    print("OK")
+    print()
+
+
+def test_machine_cap():
+    """Test that the least recently updated machine is dropped at the cap"""
+    print("Testing machine cap...")
+    history = SensorHistory(fields=('a',), max_machines=2)
+    history.record('m1', 0, {'a': 1.0})
+    history.record('m2', 0, {'a': 1.0})
+    history.record('m1', 1000, {'a': 2.0})
+    history.record('m3', 0, {'a': 1.0})
+    assert set(history.stats()) == {'m1', 'm3'}
+    print("OK")
+    print()
+
+
+if __name__ == "__main__":
+    print("Compressed History Codec Tests")
+    print("=" * 40)
+
+    test_timestamp_buckets()
+    test_special_values()
+    test_random_round_trip()
+    test_series_query()
+    test_machine_cap()
+
+    print("All tests completed!")
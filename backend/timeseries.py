@@ -0,0 +1,453 @@
+"""
+Compressed in-memory time-series storage for recent sensor history
+
+Readings are packed Gorilla-style into fixed-size blocks: timestamps are
+stored as delta-of-deltas and each sensor column as XOR-compressed float64
+values. Sealed blocks are immutable bytes and decode block-wise into NumPy
+arrays. Decoding walks the bit stream in Python, so it is favoured for
+compactness rather than speed; queries should bound `since` or `limit`.
+"""
+
+import math
+import struct
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+
+import numpy as np
+
+# Columns kept for every reading (mirrors the LiveData shape on the frontend)
+SENSOR_FIELDS = (
+    'temperature',
+    'humidity',
+    'decibel',
+    'vibration_x',
+    'vibration_y',
+    'vibration_z',
+    'vibration_magnitude',
+    'relayState',
+    'is_anomaly',
+)
+
+DEFAULT_BLOCK_SIZE = 512
+DEFAULT_MAX_BLOCKS = 256
+DEFAULT_MAX_MACHINES = 1000
+
+# Delta-of-delta buckets: (control bits, control width, payload width)
+_DOD_BUCKETS = (
+    (0b10, 2, 7),
+    (0b110, 3, 9),
+    (0b1110, 4, 12),
+)
+_DOD_ESCAPE = (0b1111, 4, 64)
+
+_MASK64 = (1 << 64) - 1
+
+
+def parse_timestamp_strict(timestamp):
+    """Convert an ISO string or epoch seconds/ms to epoch milliseconds; raise ValueError if unparseable"""
+    if isinstance(timestamp, (int, float)):
+        if not math.isfinite(timestamp) or abs(timestamp) >= 1e17:
+            raise ValueError(f"Invalid timestamp: {timestamp}")
+        # Values this large are already milliseconds
+        return int(timestamp) if timestamp > 1e11 else int(timestamp * 1000)
+    text = str(timestamp).strip()
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+    try:
+        return int(datetime.fromisoformat(text).timestamp() * 1000)
+    except ValueError:
+        pass
+    try:
+        return parse_timestamp_strict(float(text))
+    except ValueError:
+        raise ValueError(f"Invalid timestamp: {timestamp}") from None
+
+
+def parse_timestamp_ms(timestamp):
+    """Convert a reading timestamp (ISO string, epoch seconds/ms or None) to epoch milliseconds
+
+    Missing or unparseable timestamps fall back to the time of arrival.
+    """
+    if timestamp is None or timestamp == '':
+        return int(datetime.now().timestamp() * 1000)
+    try:
+        return parse_timestamp_strict(timestamp)
+    except ValueError:
+        return int(datetime.now().timestamp() * 1000)
+
+
+def _float_to_bits(value):
+    return struct.unpack('>Q', struct.pack('>d', float(value)))[0]
+
+
+class BitWriter:
+    """Append-only bit stream backed by a bytearray"""
+
+    __slots__ = ('buffer', 'acc', 'acc_bits')
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.acc = 0
+        self.acc_bits = 0
+
+    def write(self, value, nbits):
+        """Write the low `nbits` bits of `value`, most significant first"""
+        if nbits == 0:
+            return
+        self.acc = (self.acc << nbits) | (value & ((1 << nbits) - 1))
+        self.acc_bits += nbits
+        while self.acc_bits >= 8:
+            self.acc_bits -= 8
+            self.buffer.append((self.acc >> self.acc_bits) & 0xFF)
+        self.acc &= (1 << self.acc_bits) - 1
+
+    def getvalue(self):
+        """Return the stream padded with zero bits to a whole byte"""
+        if self.acc_bits:
+            return bytes(self.buffer) + bytes([(self.acc << (8 - self.acc_bits)) & 0xFF])
+        return bytes(self.buffer)
+
+
+class BitReader:
+    """Sequential reader over a byte string produced by BitWriter"""
+
+    __slots__ = ('data', 'pos')
+
+    def __init__(self, data):
+        # Pad so a 9-byte window is always available at the tail
+        self.data = bytes(data) + b'\x00' * 9
+        self.pos = 0
+
+    def read(self, nbits):
+        """Read `nbits` bits (at most 64) as an unsigned integer"""
+        if nbits == 0:
+            return 0
+        byte_index = self.pos >> 3
+        offset = self.pos & 7
+        window = int.from_bytes(self.data[byte_index:byte_index + 9], 'big')
+        self.pos += nbits
+        return (window >> (72 - offset - nbits)) & ((1 << nbits) - 1)
+
+    def read_bit(self):
+        bit = (self.data[self.pos >> 3] >> (7 - (self.pos & 7))) & 1
+        self.pos += 1
+        return bit
+
+
+def encode_timestamps(timestamps_ms):
+    """Encode epoch-millisecond timestamps as first value plus delta-of-deltas"""
+    writer = BitWriter()
+    if not timestamps_ms:
+        return writer.getvalue()
+
+    writer.write(timestamps_ms[0] & _MASK64, 64)
+    prev_ts = timestamps_ms[0]
+    prev_delta = 0
+    for ts in timestamps_ms[1:]:
+        delta = ts - prev_ts
+        dod = delta - prev_delta
+        if dod == 0:
+            writer.write(0, 1)
+        else:
+            for control, control_bits, payload_bits in _DOD_BUCKETS:
+                limit = 1 << (payload_bits - 1)
+                if -limit < dod <= limit:
+                    writer.write(control, control_bits)
+                    writer.write(dod + limit - 1, payload_bits)
+                    break
+            else:
+                control, control_bits, payload_bits = _DOD_ESCAPE
+                writer.write(control, control_bits)
+                writer.write(dod & _MASK64, payload_bits)
+        prev_ts = ts
+        prev_delta = delta
+    return writer.getvalue()
+
+
+def decode_timestamps(data, count):
+    """Decode `count` timestamps into an int64 NumPy array"""
+    if count == 0:
+        return np.empty(0, dtype=np.int64)
+
+    reader = BitReader(data)
+    first = reader.read(64)
+    dods = [first - (1 << 64) if first >> 63 else first]
+    append = dods.append
+    for _ in range(1, count):
+        if not reader.read_bit():
+            append(0)
+            continue
+        # Control codes are 10, 110, 1110 and 1111 (escape)
+        if not reader.read_bit():
+            payload_bits = 7
+        elif not reader.read_bit():
+            payload_bits = 9
+        elif not reader.read_bit():
+            payload_bits = 12
+        else:
+            raw = reader.read(64)
+            append(raw - (1 << 64) if raw >> 63 else raw)
+            continue
+        append(reader.read(payload_bits) - (1 << (payload_bits - 1)) + 1)
+
+    # Two prefix sums turn delta-of-deltas back into absolute timestamps
+    dods = np.array(dods, dtype=np.int64)
+    timestamps = np.empty(count, dtype=np.int64)
+    timestamps[0] = dods[0]
+    timestamps[1:] = dods[0] + np.cumsum(np.cumsum(dods[1:]))
+    return timestamps
+
+
+def encode_values(values):
+    """XOR-compress a sequence of floats"""
+    writer = BitWriter()
+    if not values:
+        return writer.getvalue()
+
+    prev = _float_to_bits(values[0])
+    writer.write(prev, 64)
+    prev_leading = -1
+    prev_trailing = 0
+    for value in values[1:]:
+        bits = _float_to_bits(value)
+        xor = bits ^ prev
+        prev = bits
+        if xor == 0:
+            writer.write(0, 1)
+            continue
+        writer.write(1, 1)
+        leading = min(64 - xor.bit_length(), 31)
+        trailing = (xor & -xor).bit_length() - 1
+        if prev_leading >= 0 and leading >= prev_leading and trailing >= prev_trailing:
+            # Reuse the previous window of meaningful bits
+            writer.write(0, 1)
+            writer.write(xor >> prev_trailing, 64 - prev_leading - prev_trailing)
+        else:
+            meaningful = 64 - leading - trailing
+            writer.write(1, 1)
+            writer.write(leading, 5)
+            writer.write(meaningful - 1, 6)
+            writer.write(xor >> trailing, meaningful)
+            prev_leading = leading
+            prev_trailing = trailing
+    return writer.getvalue()
+
+
+def decode_values(data, count):
+    """Decode `count` XOR-compressed floats into a float64 NumPy array"""
+    if count == 0:
+        return np.empty(0, dtype=np.float64)
+
+    reader = BitReader(data)
+    xors = [reader.read(64)]
+    append = xors.append
+    leading = 0
+    trailing = 0
+    for _ in range(1, count):
+        if not reader.read_bit():
+            append(0)
+            continue
+        if reader.read_bit():
+            leading = reader.read(5)
+            meaningful = reader.read(6) + 1
+            trailing = 64 - leading - meaningful
+        append(reader.read(64 - leading - trailing) << trailing)
+
+    # Undo the XOR chain in one vectorised pass
+    return np.bitwise_xor.accumulate(np.array(xors, dtype=np.uint64)).view(np.float64)
+
+
+class Block:
+    """Sealed, immutable block of compressed readings"""
+
+    __slots__ = ('count', 'start_ms', 'end_ms', 'timestamps', 'columns')
+
+    def __init__(self, count, start_ms, end_ms, timestamps, columns):
+        self.count = count
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.timestamps = timestamps
+        self.columns = columns
+
+    @property
+    def nbytes(self):
+        return len(self.timestamps) + sum(len(column) for column in self.columns)
+
+    def decode(self, field_indexes=None):
+        """Decode the block into (timestamps, [column arrays])"""
+        indexes = range(len(self.columns)) if field_indexes is None else field_indexes
+        timestamps = decode_timestamps(self.timestamps, self.count)
+        return timestamps, [decode_values(self.columns[i], self.count) for i in indexes]
+
+
+def encode_block(timestamps, columns):
+    """Compress a list of timestamps and one list of values per field into a Block"""
+    return Block(
+        count=len(timestamps),
+        start_ms=timestamps[0],
+        end_ms=timestamps[-1],
+        timestamps=encode_timestamps(timestamps),
+        columns=[encode_values(column) for column in columns],
+    )
+
+
+class CompressedSeries:
+    """Bounded multi-column series: an uncompressed head plus sealed blocks"""
+
+    def __init__(self, fields=SENSOR_FIELDS, block_size=DEFAULT_BLOCK_SIZE, max_blocks=DEFAULT_MAX_BLOCKS):
+        self.fields = tuple(fields)
+        self.block_size = block_size
+        self.blocks = deque(maxlen=max_blocks)
+        self._head_timestamps = []
+        self._head_columns = [[] for _ in self.fields]
+        # Total readings ever appended; lets callers find readings added since a view
+        self.appended = 0
+
+    def __len__(self):
+        return sum(block.count for block in self.blocks) + len(self._head_timestamps)
+
+    @property
+    def nbytes(self):
+        """Approximate payload bytes held (head counted at 8 bytes per value)"""
+        head = len(self._head_timestamps) * 8 * (len(self.fields) + 1)
+        return sum(block.nbytes for block in self.blocks) + head
+
+    def append(self, timestamp_ms, values):
+        """Append one reading; `values` maps field name to number"""
+        self._head_timestamps.append(int(timestamp_ms))
+        self.appended += 1
+        for column, field in zip(self._head_columns, self.fields):
+            column.append(float(values.get(field, 0) or 0))
+        if len(self._head_timestamps) >= self.block_size:
+            self.seal()
+
+    def head_block(self):
+        """Compress the current head into a block without sealing it (None if empty)"""
+        if not self._head_timestamps:
+            return None
+        return encode_block(self._head_timestamps, self._head_columns)
+
+    def replace(self, blocks, head_timestamps, head_columns):
+        """Replace all stored readings with sealed `blocks` plus an uncompressed head"""
+        self.blocks.clear()
+        self.blocks.extend(blocks)
+        self._head_timestamps = list(head_timestamps)
+        self._head_columns = [list(column) for column in head_columns]
+
+    def seal(self):
+        """Compress the current head into a block"""
+        block = self.head_block()
+        if block is None:
+            return
+        self.blocks.append(block)
+        self._head_timestamps = []
+        self._head_columns = [[] for _ in self.fields]
+
+    def view(self):
+        """Return a cheap copy of (blocks, head timestamps, head columns) that later appends won't touch"""
+        return list(self.blocks), list(self._head_timestamps), [list(column) for column in self._head_columns]
+
+    def to_numpy(self, fields=None, since_ms=None, limit=None):
+        """Decode the series into a dict of NumPy arrays keyed by 'timestamp' and field name"""
+        return decode_view(self.fields, self.view(), fields, since_ms, limit)
+
+
+def decode_view(all_fields, view, fields=None, since_ms=None, limit=None):
+    """Decode a series view, newest block first, stopping once `limit` readings are collected"""
+    fields = all_fields if fields is None else tuple(fields)
+    unknown = [field for field in fields if field not in all_fields]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if limit is not None and limit < 0:
+        raise ValueError("limit must not be negative")
+    indexes = [all_fields.index(field) for field in fields]
+    blocks, head_timestamps, head_columns = view
+
+    parts = []
+    collected = 0
+    if head_timestamps:
+        parts.append((
+            np.asarray(head_timestamps, dtype=np.int64),
+            [np.asarray(head_columns[i], dtype=np.float64) for i in indexes],
+        ))
+    parts.extend(block for block in reversed(blocks) if since_ms is None or block.end_ms >= since_ms)
+
+    # Walk newest-first so a small `limit` only decodes the blocks it needs
+    ts_parts = []
+    column_parts = [[] for _ in fields]
+    for part in parts:
+        if limit is not None and collected >= limit:
+            break
+        timestamps, columns = part.decode(indexes) if isinstance(part, Block) else part
+        if since_ms is not None:
+            mask = timestamps >= since_ms
+            timestamps = timestamps[mask]
+            columns = [column[mask] for column in columns]
+        ts_parts.append(timestamps)
+        for column_part, column in zip(column_parts, columns):
+            column_part.append(column)
+        collected += len(timestamps)
+
+    result = {'timestamp': np.concatenate(ts_parts[::-1]) if ts_parts else np.empty(0, dtype=np.int64)}
+    for field, column_part in zip(fields, column_parts):
+        result[field] = np.concatenate(column_part[::-1]) if column_part else np.empty(0, dtype=np.float64)
+    if limit is not None:
+        result = {key: array[len(array) - limit:] if len(array) > limit else array for key, array in result.items()}
+    return result
+
+
+class SensorHistory:
+    """Per-machine compressed history of recent readings
+
+    At most `max_machines` series are kept; when a new machine appears, the
+    one that has gone longest without a reading is evicted.
+    """
+
+    def __init__(self, fields=SENSOR_FIELDS, block_size=DEFAULT_BLOCK_SIZE, max_blocks=DEFAULT_MAX_BLOCKS,
+                 max_machines=DEFAULT_MAX_MACHINES):
+        self.fields = tuple(fields)
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self.max_machines = max_machines
+        self.series = OrderedDict()
+        self.evicted = 0
+        self.lock = threading.Lock()
+
+    def _series_for(self, machine_id):
+        series = self.series.get(machine_id)
+        if series is None:
+            series = CompressedSeries(self.fields, self.block_size, self.max_blocks)
+            self.series[machine_id] = series
+            if len(self.series) > self.max_machines:
+                self.series.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.series.move_to_end(machine_id)
+        return series
+
+    def record(self, machine_id, timestamp_ms, values):
+        """Store one reading for a machine"""
+        with self.lock:
+            self._series_for(machine_id).append(timestamp_ms, values)
+
+    def query(self, machine_id, fields=None, since_ms=None, limit=None):
+        """Return decoded history for a machine as NumPy arrays (None if unknown)
+
+        Raises ValueError for unknown field names or a negative limit.
+        """
+        # Only the view is copied under the lock; decoding runs without blocking ingest
+        with self.lock:
+            series = self.series.get(machine_id)
+            if series is None:
+                return None
+            view = series.view()
+        return decode_view(self.fields, view, fields, since_ms, limit)
+
+    def stats(self):
+        """Summarise stored readings and memory use per machine"""
+        with self.lock:
+            return {
+                machine_id: {'readings': len(series), 'blocks': len(series.blocks), 'bytes': series.nbytes}
+                for machine_id, series in self.series.items()
+            }